@@ -1,25 +1,169 @@
 #!/usr/bin/env python3
 
 # cli_common.py
-import os
+import asyncio
+import atexit
+import datetime
+import sys
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Iterator, Tuple, Callable
-    
+
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.application.run_in_terminal import run_in_terminal
 from prompt_toolkit.document import Document
 from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
 from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit.validation import Validator, ValidationError
+from prompt_toolkit.history import FileHistory
+
+from validators import validators, make_enum_validator
+from suggestors import suggestors, get_suggestor_values, SUGGESTOR_TTL
+
+# Completion rows are cached per compiled node. Rows that include suggestor
+# output expire after SUGGESTOR_TTL seconds; nodes whose suggestor is marked
+# "dynamic" in the schema are never cached.
+_ROWS_CACHE_SIZE = 256
+_ROWS_CACHE: "OrderedDict[CompiledNode, Tuple[Optional[float], List[List[str]], Tuple[str, ...]]]" = OrderedDict()
+# Completion listings are built on _FORMAT_POOL, so cache access is locked
+_ROWS_LOCK = threading.Lock()
+_FORMAT_POOL = ThreadPoolExecutor(max_workers=1)
+
+# Completions that were not explicitly requested (e.g. while typing) give up
+# after _COMPLETION_BUDGET seconds, checked every _COMPLETION_CHECK_EVERY yields.
+_COMPLETION_BUDGET = 0.05
+_COMPLETION_CHECK_EVERY = 32
+
+# Bumped whenever a node is recompiled in place, so callers holding nodes
+# from an earlier walk know to walk again.
+_tree_generation = 0
+
+def _prefix_range(keys: Tuple[str, ...], prefix: str) -> Tuple[int, int]:
+    """Return the [start, end) slice of sorted keys that start with prefix."""
+    start = end = bisect_left(keys, prefix)
+    while end < len(keys) and keys[end].startswith(prefix):
+        end += 1
+    return start, end
+
+def _lcp(a: str, b: str) -> str:
+    """Longest common prefix of two strings."""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return a[:i]
+
+def _lcp_sorted(keys: Tuple[str, ...]) -> str:
+    """Longest common prefix of sorted keys, which is that of the first and last key."""
+    if not keys:
+        return ""
+    return _lcp(keys[0], keys[-1])
+
+@dataclass(slots=True, eq=False)
+class CompiledNode:
+    """A command tree node preprocessed for fast traversal."""
+    static: Dict[str, "CompiledNode"] = field(default_factory=dict)
+    tag: Optional["CompiledNode"] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+    sorted_keys: Tuple[str, ...] = ()
+    has_command: bool = False
+    is_tag: bool = False
+    validate_fn: Optional[Callable[[str], bool]] = None
+    # Fills in the children of a lazily built node the first time it is walked into
+    expand: Optional[Callable[["CompiledNode"], None]] = None
+
+def compile_tree(raw: Dict[str, Any], node: Optional[CompiledNode] = None) -> CompiledNode:
+    """
+    Compile a JSON command tree into CompiledNode objects.
+    If node is given, it is rebuilt in place so existing references stay valid.
+    """
+    global _tree_generation
+    if node is None:
+        node = CompiledNode()
+    else:
+        with _ROWS_LOCK:
+            _ROWS_CACHE.pop(node, None)
+        _tree_generation += 1
+
+    static = {}
+    meta = {}
+    tag = None
+    for key, val in raw.items():
+        if isinstance(val, dict):
+            child = compile_tree(val)
+            static[sys.intern(key)] = child
+            if tag is None and child.is_tag:
+                tag = child
+        else:
+            meta[key] = val
+
+    node.static = static
+    node.tag = tag
+    node.meta = meta
+    node.sorted_keys = tuple(sorted(k for k, v in static.items() if not v.is_tag))
+    node.has_command = "command" in meta
+    node.is_tag = meta.get("type") == "tagNode"
+    node.validate_fn = _make_validate_fn(meta) if node.is_tag else None
+    return node
+
+def update_child(node: CompiledNode, key: str, raw: Optional[Dict[str, Any]]) -> None:
+    """Recompile a single child of node in place (or drop it when raw is None), leaving its siblings alone."""
+    global _tree_generation
+    with _ROWS_LOCK:
+        _ROWS_CACHE.pop(node, None)
+    _tree_generation += 1
+
+    key = sys.intern(key)
+    if raw is None:
+        node.static.pop(key, None)
+    else:
+        node.static[key] = compile_tree(raw)
+    set_children(node, node.static)
+
+def set_children(node: CompiledNode, static: Dict[str, CompiledNode]) -> None:
+    """Replace a node's children and recompute the lookups derived from them."""
+    node.static = static
+    node.tag = next((child for child in static.values() if child.is_tag), None)
+    node.sorted_keys = tuple(sorted(k for k, v in static.items() if not v.is_tag))
+
+def _expand(node: CompiledNode) -> None:
+    """Materialize the children of a lazily built node."""
+    expand = node.expand
+    if expand is not None:
+        node.expand = None
+        expand(node)
+
+def _make_validate_fn(meta: Dict[str, Any]) -> Optional[Callable[[str], bool]]:
+    """Resolve a tagNode's validator to a single callable."""
+    validator_type = meta.get("validator")
+    if not validator_type:
+        return None
+    if validator_type == "enum":
+        return make_enum_validator(meta.get("enum-values", []))
+    return validators.get(validator_type)
 
-from tabulate import tabulate
-
-from validators import validators
-from suggestors import suggestors
+def _walk(node: CompiledNode, path: List[str]) -> Optional[CompiledNode]:
+    """Follow path from node, falling back to the tagNode child; None if it leads nowhere."""
+    for part in path:
+        child = node.static.get(part)
+        if child is None:
+            child = node.tag
+            if child is None:
+                return None
+        node = child
+        if node.expand is not None:
+            _expand(node)
+    return node
 
 class AutoSuggestFromTree(AutoSuggest):
     """Provides auto-suggestions based on a command tree structure."""
     
-    def __init__(self, root: Dict[str, Any]):
+    def __init__(self, root: CompiledNode):
         self.root = root
 
     def get_suggestion(self, buffer: Any, document: Document) -> Optional[Suggestion]:
@@ -31,36 +175,38 @@ class AutoSuggestFromTree(AutoSuggest):
             return None
 
         *base_parts, last_part = parts
-        for part in base_parts:
-            node = node.get(part) or next((v for k, v in node.items()
-                                           if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-            if not node:
-                return None
+        node = _walk(node, base_parts)
+        if node is None:
+            return None
 
         # Only suggest static (non-tagNode) keys
-        candidates = [k for k in node
-                      if isinstance(node[k], dict) and node[k].get("type") != "tagNode" and k.startswith(last_part)]
-
-        if not candidates:
+        keys = node.sorted_keys
+        start, end = _prefix_range(keys, last_part)
+        if start == end:
             return None
 
-        common_prefix = os.path.commonprefix(candidates)
+        common_prefix = keys[start] if end == start + 1 else _lcp(keys[start], keys[end - 1])
 
         if common_prefix and common_prefix != last_part:
             return Suggestion(common_prefix[len(last_part):])
 
         return None
 
+def _out_of_budget(complete_event: Any, start: float) -> bool:
+    """True if an unrequested completion run has used up its time budget."""
+    return (not complete_event.completion_requested
+            and time.monotonic() - start > _COMPLETION_BUDGET)
+
 class TreeCompleter(Completer):
     """Provides command completion based on a tree structure."""
     
-    def __init__(self, tree: Dict[str, Any]):
+    def __init__(self, tree: CompiledNode):
         self.tree = tree
 
     def get_completions(self, document: Document, complete_event: Any) -> Iterator[Completion]:
         """Get completions for current input."""
         text = document.text_before_cursor
-        parts = text.strip().split()
+        parts = [sys.intern(p) for p in text.strip().split()]
         node = self.tree
 
         is_mid_token = not text.endswith(" ")
@@ -71,133 +217,165 @@ class TreeCompleter(Completer):
             yield from self._get_base_completions(node)
             return
 
-        for part in path_parts:
-            node = node.get(part) or next((v for k, v in node.items()
-                                           if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-            if not node:
-                return
+        node = _walk(node, path_parts)
+        if node is None:
+            return
 
-        if isinstance(node, dict):
-            yield from self._get_node_completions(node, last_word)
+        yield from self._get_node_completions(node, last_word, complete_event)
 
-    def _get_base_completions(self, node: Dict[str, Any]) -> Iterator[Completion]:
+    def _get_base_completions(self, node: CompiledNode) -> Iterator[Completion]:
         """Get completions for base level commands."""
-        for key, val in node.items():
-            if isinstance(val, dict) and val.get("type") != "tagNode":
+        for key, val in node.static.items():
+            if not val.is_tag:
                 yield Completion(text=key, start_position=0)
 
-    def _get_node_completions(self, node: Dict[str, Any], last_word: str) -> Iterator[Completion]:
+    def _get_node_completions(self, node: CompiledNode, last_word: str,
+                              complete_event: Any) -> Iterator[Completion]:
         """Get completions for a specific node in the tree."""
-        for key, val in node.items():
-            if not isinstance(val, dict):
-                continue
+        start = time.monotonic()
+        count = 0
+
+        keys = node.sorted_keys
+        i = bisect_left(keys, last_word)
+        while i < len(keys) and keys[i].startswith(last_word):
+            yield Completion(text=keys[i], start_position=-len(last_word))
+            i += 1
+            count += 1
+            if count % _COMPLETION_CHECK_EVERY == 0 and _out_of_budget(complete_event, start):
+                return
 
-            if val.get("type") == "tagNode" and "suggestor" in val:
-                sugg_name = val["suggestor"]
-                if sugg_name in suggestors:
-                    args = val.get("suggestor_args", [])
-                    try:
-                        for option in suggestors[sugg_name](*args):
-                            if option.startswith(last_word):
-                                yield Completion(text=option, start_position=-len(last_word))
-                    except Exception as e:
-                        yield Completion(text=f"<error: {sugg_name}>", start_position=0)
-            elif val.get("type") != "tagNode" and key.startswith(last_word):
-                yield Completion(text=key, start_position=-len(last_word))
+        tag = node.tag
+        if tag is not None and "suggestor" in tag.meta:
+            sugg_name = tag.meta["suggestor"]
+            if sugg_name in suggestors:
+                args = tag.meta.get("suggestor_args", [])
+                try:
+                    for option in get_suggestor_values(sugg_name, args, tag.meta.get("dynamic", False)):
+                        if option.startswith(last_word):
+                            yield Completion(text=option, start_position=-len(last_word))
+                            count += 1
+                            if count % _COMPLETION_CHECK_EVERY == 0 and _out_of_budget(complete_event, start):
+                                return
+                except Exception as e:
+                    yield Completion(text=f"<error: {sugg_name}>", start_position=0)
 
 class CommandValidator(Validator):
     """Validates commands against a command tree structure."""
     
-    def __init__(self, root: Dict[str, Any]):
+    def __init__(self, root: CompiledNode):
         self.root = root
 
     def validate(self, document: Document) -> None:
         """Validate the command against the command tree."""
-        parts = document.text.strip().split()
+        text = document.text
+        self.validate_parts([sys.intern(p) for p in text.strip().split()], text)
+
+    def validate_parts(self, parts: List[str], text: str) -> None:
+        """Validate an already split command; text is only used to place the cursor on errors."""
         node = self.root
 
         for part in parts:
-            if part in node:
-                node = node[part]
-            else:
-                tag_entry = next(((k, v) for k, v in node.items()
-                                  if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-                if tag_entry:
-                    tag_node = tag_entry[1]
-                    validator_type = tag_node.get("validator")
-                    if validator_type:
-                        if validator_type == "enum":
-                            allowed = tag_node.get("enum-values", [])
-                            validator_fn = lambda v: v in allowed
-                        else:
-                            validator_fn = validators.get(validator_type)
-
-                        if validator_fn and not validator_fn(part):
-                            raise ValidationError(
-                                message=f"'{part}' is not a valid {validator_type.replace('-', ' ')}.",
-                                cursor_position=document.text.find(part)
-                            )
-
-                    node = tag_node
-                else:
-                    break
-
-def print_possible_completions(path: List[str], root: Dict[str, Any]) -> None:
-    """Print possible completions for the current command path."""
-    node = root
+            if node.expand is not None:
+                _expand(node)
+            child = node.static.get(part)
+            if child is not None:
+                node = child
+                continue
 
-    for part in path:
-        if part in node:
-            node = node[part]
-        else:
-            tag_entry = next((v for k, v in node.items()
-                              if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-            if tag_entry:
-                node = tag_entry
-            else:
-                print("No completions found.\n")
-                return
+            tag_node = node.tag
+            if tag_node is None:
+                break
 
-    if not isinstance(node, dict):
-        print("No completions found.\n")
-        return
+            validate_fn = tag_node.validate_fn
+            if validate_fn is not None and not validate_fn(part):
+                validator_type = tag_node.meta["validator"]
+                raise ValidationError(
+                    message=f"'{part}' is not a valid {validator_type.replace('-', ' ')}.",
+                    cursor_position=text.find(part)
+                )
 
-    rows = [["<enter>", "Execute the current command"]] if "command" in node else []
-    rows.extend(_get_completion_rows(node))
+            node = tag_node
 
-    if not rows:
-        print("No completions found.\n")
-        return
+def format_possible_completions(path: List[str], root: CompiledNode) -> str:
+    """Build the possible completions listing for the current command path."""
+    return _format_node_completions(_walk(root, path))
 
-    print("\nPossible completions:\n")
-    print("  " + tabulate(rows, tablefmt="plain").replace("\n", "\n  "))
+def _format_node_completions(node: Optional[CompiledNode]) -> str:
+    """Build the possible completions listing for an already resolved node."""
+    if node is None:
+        return "No completions found.\n\n"
 
-def _get_completion_rows(node: Dict[str, Any]) -> List[List[str]]:
-    """Get completion rows for a node."""
-    rows = []
-    for k, v in node.items():
-        if not isinstance(v, dict):
-            continue
+    rows = [["<enter>", "Execute the current command"]] if node.has_command else []
+    rows.extend(_get_completion_rows(node))
 
-        desc = v.get("description", "")
-        node_type = v.get("type")
+    if not rows:
+        return "No completions found.\n\n"
 
-        if node_type == "tagNode":
-            rows.append([k, desc])
-            if "suggestor" in v:
-                rows.extend(_get_suggestor_rows(v))
-        else:
-            rows.append([k, desc])
-    return rows
+    return "\nPossible completions:\n\n" + _format_rows(rows) + "\n"
+
+async def _print_completions_async(node: Optional[CompiledNode]) -> None:
+    """
+    Format the listing for a node resolved on the event loop, and only write it from the terminal.
+    The worker thread never walks the tree, so lazy nodes are only expanded on the loop.
+    """
+    if node is None:
+        text = "No completions found.\n\n"
+    else:
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(_FORMAT_POOL, _format_node_completions, node)
+    await run_in_terminal(lambda: sys.stdout.write(text))
+
+def _format_rows(rows: List[List[str]]) -> str:
+    """Format [name, description] rows as an indented two-column listing."""
+    width = max((len(r[0]) for r in rows), default=0)
+    return "\n".join(f"  {r[0].ljust(width)}  {r[1]}".rstrip() for r in rows)
+
+def _get_completion_rows(node: CompiledNode) -> List[List[str]]:
+    """Get completion rows for a node. The returned list is shared and must not be modified."""
+    return _get_completion_entry(node)[0]
+
+def _get_completion_names(node: CompiledNode) -> Tuple[str, ...]:
+    """Get the sorted completable (non-placeholder) names shown in a node's rows."""
+    return _get_completion_entry(node)[1]
+
+def _get_completion_entry(node: CompiledNode) -> Tuple[List[List[str]], Tuple[str, ...]]:
+    """Build or fetch the cached completion rows and sorted names for a node."""
+    with _ROWS_LOCK:
+        cached = _ROWS_CACHE.get(node)
+        if cached is not None:
+            expires, rows, names = cached
+            if expires is None or time.monotonic() < expires:
+                _ROWS_CACHE.move_to_end(node)
+                return rows, names
 
-def _get_suggestor_rows(node: Dict[str, Any]) -> List[List[str]]:
+    rows = []
+    expires = None
+    cacheable = True
+    for k, v in node.static.items():
+        rows.append([k, v.meta.get("description", "")])
+        if v.is_tag and "suggestor" in v.meta:
+            if v.meta.get("dynamic", False):
+                cacheable = False
+            elif expires is None:
+                expires = time.monotonic() + SUGGESTOR_TTL
+            rows.extend(_get_suggestor_rows(v))
+    names = tuple(sorted(r[0] for r in rows if not r[0].startswith('<')))
+
+    if cacheable:
+        with _ROWS_LOCK:
+            _ROWS_CACHE[node] = (expires, rows, names)
+            if len(_ROWS_CACHE) > _ROWS_CACHE_SIZE:
+                _ROWS_CACHE.popitem(last=False)
+    return rows, names
+
+def _get_suggestor_rows(node: CompiledNode) -> List[List[str]]:
     """Get completion rows from a suggestor."""
     rows = []
-    sugg_name = node["suggestor"]
-    args = node.get("suggestor_args", [])
+    sugg_name = node.meta["suggestor"]
+    args = node.meta.get("suggestor_args", [])
     if sugg_name in suggestors:
         try:
-            suggestions = suggestors[sugg_name](*args)
+            suggestions = get_suggestor_values(sugg_name, args, node.meta.get("dynamic", False))
             rows.extend([[s, ""] for s in suggestions])
         except Exception as e:
             rows.append([f"<error calling {sugg_name}>", str(e)])
@@ -205,54 +383,68 @@ def _get_suggestor_rows(node: Dict[str, Any]) -> List[List[str]]:
         rows.append([f"<missing suggestor: {sugg_name}>", ""])
     return rows
 
-def setup_keybindings(commands_json: Dict[str, Any], 
-                     print_possible_completions: Callable[[List[str], Dict[str, Any]], None],
-                     suggestors: Dict[str, Callable]) -> KeyBindings:
+def setup_keybindings(command_tree: CompiledNode) -> KeyBindings:
     """Set up key bindings for the CLI."""
     bindings = KeyBindings()
 
+    # Tokens and resolved nodes for the last buffer text seen, shared by ? and tab
+    last = {"text": None, "generation": None, "parts": [], "nodes": {}}
+
+    def tokenize(text):
+        if text != last["text"] or last["generation"] != _tree_generation:
+            last["text"] = text
+            last["generation"] = _tree_generation
+            last["parts"] = [sys.intern(p) for p in text.split()]
+            last["nodes"] = {}
+        return last["parts"]
+
+    def resolve(parts, depth):
+        nodes = last["nodes"]
+        if depth not in nodes:
+            nodes[depth] = _walk(command_tree, parts[:depth])
+        return nodes[depth]
+
+    def show_completions(event, parts):
+        # Resolve now; the listing itself is printed by a background task
+        event.app.create_background_task(_print_completions_async(resolve(parts, len(parts))))
+
     @bindings.add('?', eager=True)
     def show_possible(event):
         buffer = event.app.current_buffer
-        text = buffer.text.strip()
-        parts = text.split()
-        run_in_terminal(lambda: print_possible_completions(parts if parts else [], commands_json))
+        show_completions(event, tokenize(buffer.text))
         buffer.insert_text("")
 
     @bindings.add('tab')
     def autocomplete(event):
         buffer = event.app.current_buffer
         text = buffer.text
-        document = Document(text=text, cursor_position=len(text))
-
-        parts = text.strip().split()
+        parts = tokenize(text)
         if not parts:
             return
 
-        is_mid_token = not text.endswith(" ")
+        is_mid_token = not text[-1].isspace()
         last_token = parts[-1] if is_mid_token else ""
         last_token_len = len(last_token)
 
         # Traverse to node
-        node = commands_json
-        for part in parts[:-1] if is_mid_token else parts:
-            node = node.get(part) or next((v for k, v in node.items()
-                                           if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-            if not node:
-                return
+        node = resolve(parts, len(parts) - 1 if is_mid_token else len(parts))
+        if node is None:
+            return
 
         rows = _get_completion_rows(node)
 
-        if "command" in node:
-            rows.insert(0, ["<enter>", "Execute the current command"])
+        if node.has_command:
+            rows = [["<enter>", "Execute the current command"]] + rows
 
         if not rows:
             return
 
-        plain_matches = [r[0] for r in rows if not r[0].startswith('<') and r[0].startswith(last_token)]
+        names = _get_completion_names(node)
+        start, end = _prefix_range(names, last_token)
+        plain_matches = names[start:end]
 
         if plain_matches:
-            common_prefix = os.path.commonprefix(plain_matches)
+            common_prefix = _lcp_sorted(plain_matches)
             if len(plain_matches) == 1:
                 # If there's only one valid match, complete and add a space
                 if is_mid_token:
@@ -267,9 +459,52 @@ def setup_keybindings(commands_json: Dict[str, Any],
                 return
 
         # If no direct completion possible, show all possibilities
-        run_in_terminal(lambda: print_possible_completions(parts if parts else [], commands_json))
+        show_completions(event, parts)
 
     return bindings
     
 
-                
\ No newline at end of file
+                
+
+# Histories with entries that may still need writing at interpreter exit; weak so
+# that a finished configure session's history can be collected
+_open_histories: "weakref.WeakSet[BatchedFileHistory]" = weakref.WeakSet()
+
+@atexit.register
+def _flush_histories() -> None:
+    for history in list(_open_histories):
+        history.flush()
+
+class BatchedFileHistory(FileHistory):
+    """
+    FileHistory that appends entries in batches instead of reopening the file per command.
+    Pending entries are written once max_pending accumulate, when max_delay seconds have
+    passed since the last write, on flush() and at interpreter exit.
+    """
+
+    def __init__(self, filename, max_pending: int = 32, max_delay: float = 1.0) -> None:
+        super().__init__(filename)
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self._pending: List[Tuple[datetime.datetime, str]] = []
+        self._last_flush = time.monotonic()
+        _open_histories.add(self)
+
+    def store_string(self, string: str) -> None:
+        self._pending.append((datetime.datetime.now(), string))
+        if (len(self._pending) >= self.max_pending
+                or time.monotonic() - self._last_flush >= self.max_delay):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending entries in FileHistory's on-disk format."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        chunks = []
+        for stamp, string in pending:
+            chunks.append(f"\n# {stamp}\n")
+            chunks.extend(f"+{line}\n" for line in string.split("\n"))
+        with open(self.filename, "ab") as f:
+            f.write("".join(chunks).encode("utf-8"))
@@ -1,27 +1,27 @@
 #!/usr/bin/env python3
+import copy
+import importlib.util
 import json
 import subprocess
 import os
 import socket
-from typing import Dict, List, Optional, Tuple, Any
-from tabulate import tabulate
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Any
 
 from prompt_toolkit import PromptSession
-from prompt_toolkit.completion import Completer, Completion
-from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit.application.run_in_terminal import run_in_terminal
 from prompt_toolkit.document import Document
-from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
-from prompt_toolkit.validation import Validator, ValidationError
-from prompt_toolkit.history import FileHistory
+from prompt_toolkit.validation import ValidationError
 
 from validators import validators
-from suggestors import suggestors
 
-from cli_common import AutoSuggestFromTree, TreeCompleter, CommandValidator, print_possible_completions
-from cli_common import setup_keybindings
+from cli_common import AutoSuggestFromTree, TreeCompleter, CommandValidator
+from cli_common import setup_keybindings, compile_tree, update_child, set_children, BatchedFileHistory
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
 
-from jinja2 import Environment, FileSystemLoader
 from get_commit_scripts import get_scripts_to_run
 
 # Get the directory where the script is located
@@ -36,12 +36,60 @@ class PathNotFoundError(ConfigError):
     """Raised when a configuration path is not found."""
     pass
 
+def intern_keys(data: Any) -> Any:
+    """Intern every dict key of freshly loaded JSON in place (order is preserved)."""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for key in list(item):
+                value = item.pop(key)
+                item[sys.intern(key)] = value
+                if isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(v for v in item if isinstance(v, (dict, list)))
+    return data
+
+def _dumps_config(config_dict: Dict) -> bytes:
+    """Encode a config dict as indented JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(config_dict, option=orjson.OPT_INDENT_2)
+    return json.dumps(config_dict, indent=2).encode()
+
+def _loads_config(data: bytes) -> Dict:
+    """Decode JSON bytes read from disk."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Change counters for the running and candidate configs, and their last serialized form.
+# Entries remember which config object they were built from, since every configure
+# session starts with fresh running/candidate dicts.
+_config_versions: Dict[str, int] = {"running": 0, "candidate": 0}
+_dump_cache: Dict[str, Tuple[Dict, int, str]] = {}
+
+def mark_config_changed(*names: str) -> None:
+    """Invalidate the cached dumps of the named configs ("running" and/or "candidate")."""
+    for name in names:
+        _config_versions[name] += 1
+
+def dump_config_cached(name: str, config: Dict) -> str:
+    """Serialize the running or candidate config, reusing the last dump while it is unchanged."""
+    version = _config_versions[name]
+    cached = _dump_cache.get(name)
+    if cached is not None and cached[0] is config and cached[1] == version:
+        return cached[2]
+    text = _dumps_config(config).decode()
+    _dump_cache[name] = (config, version, text)
+    return text
+
 def load_saved_config() -> Dict:
     """Load the saved configuration from disk."""
     if os.path.exists(CONFIG_SAVE_PATH):
         try:
-            with open(CONFIG_SAVE_PATH) as f:
-                return json.load(f)
+            with open(CONFIG_SAVE_PATH, "rb") as f:
+                return intern_keys(_loads_config(f.read()))
         except json.JSONDecodeError as e:
             print(f"Error loading configuration: Invalid JSON format - {e}")
         except Exception as e:
@@ -49,30 +97,77 @@ def load_saved_config() -> Dict:
     return {}
 
 def save_current_config(config_dict: Dict) -> None:
-    """Save the current configuration to disk."""
+    """
+    Save the current configuration to disk.
+    The file is written to a temporary path, fsynced and renamed over the old one,
+    so a crash mid-save never leaves a truncated config behind.
+    """
+    tmp_path = CONFIG_SAVE_PATH + ".tmp"
     try:
-        with open(CONFIG_SAVE_PATH, "w") as f:
-            json.dump(config_dict, f, indent=2)
+        data = memoryview(_dumps_config(config_dict))
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, CONFIG_SAVE_PATH)
+
+        # Persist the rename itself (not supported on Windows)
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(os.path.dirname(CONFIG_SAVE_PATH), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
         print(f"Configuration saved to {CONFIG_SAVE_PATH}")
     except Exception as e:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
         print(f"Failed to save configuration: {e}")
 
+# Parsed JSON files keyed by path -> (mtime_ns, data)
+_json_cache: Dict[str, Tuple[int, Any]] = {}
+# (commands, config_schema, merged) from the last load_commands_json call
+_merged_commands: Optional[Tuple[Dict, Dict, Dict]] = None
+
+def _load_json_cached(path: str) -> Any:
+    """Load a JSON file, reusing the parsed result while its mtime is unchanged."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _json_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        data = intern_keys(json.load(f))
+    _json_cache[path] = (mtime, data)
+    return data
+
 def load_commands_json() -> Dict:
-    """Load command structure and configuration schema."""
+    """Load command structure and configuration schema.
+
+    The returned structure is cached and shared between calls; treat it as read-only.
+    """
+    global _merged_commands
     try:
         # Load the command structure
-        with open("commands.json") as f:
-            commands = json.load(f)
-        
+        commands = _load_json_cached("commands.json")
+
         # Load the configuration schema
-        with open("config.json") as f:
-            config_schema = json.load(f)
-        
+        config_schema = _load_json_cached("config.json")
+
+        if (_merged_commands is not None and _merged_commands[0] is commands
+                and _merged_commands[1] is config_schema):
+            return _merged_commands[2]
+
         # Add the config schema to set and delete commands
-        commands["set"].update(config_schema)
-        commands["delete"].update(config_schema)
-        
-        return commands
+        merged = dict(commands)
+        merged["set"] = {**commands["set"], **config_schema}
+        merged["delete"] = {**commands["delete"], **config_schema}
+
+        index_schema(merged["set"])
+        _merged_commands = (commands, config_schema, merged)
+        return merged
     except FileNotFoundError as e:
         print(f"Error: Required JSON file not found - {e.filename}")
         raise
@@ -83,30 +178,55 @@ def load_commands_json() -> Dict:
         print(f"Error loading configuration files: {e}")
         raise
 
+_MISSING = object()
+
 def get_nested_value(d: Dict, path_parts: List[str]) -> Optional[Any]:
     """Get a nested value from a dictionary using a path list."""
     current = d
     for part in path_parts:
-        if not isinstance(current, dict) or part not in current:
+        # Config trees are plain dicts; one get() replaces the membership test and index
+        if type(current) is not dict:
+            return None
+        current = current.get(part, _MISSING)
+        if current is _MISSING:
             return None
-        current = current[part]
     return current
 
+def walk(config: Dict, prefix: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+    """Yield (path tuple, value) for every node of a nested config dict, depth first in insertion order."""
+    stack = [(prefix, iter(config.items()))]
+    while stack:
+        path, items = stack[-1]
+        for key, value in items:
+            child = path + (key,)
+            yield child, value
+            if isinstance(value, dict) and value:
+                stack.append((child, iter(value.items())))
+                break
+        else:
+            stack.pop()
+
+def extract_path(d: Dict) -> List[str]:
+    """Flatten a single-branch path dict (as built by parse_config_command) into its keys."""
+    path = []
+    while isinstance(d, dict) and d:
+        key = next(iter(d))
+        path.append(key)
+        d = d[key]
+    return path
+
 def key_exists_in_config(config_dict: Dict, path_dict: Dict) -> bool:
     """Check if a path exists in the config dictionary."""
-    def extract_path(d: Dict) -> List[str]:
-        path = []
-        while isinstance(d, dict) and d:
-            key = next(iter(d))
-            path.append(key)
-            d = d[key]
-        return path
-
-    path = extract_path(path_dict)
+    return key_exists_by_path(config_dict, extract_path(path_dict))
+
+def key_exists_by_path(config_dict: Dict, path: Tuple[str, ...]) -> bool:
+    """Check if a path tuple exists in the config dictionary."""
     return get_nested_value(config_dict, path) is not None
 
-def parse_config_command(command: str, root: Dict) -> Tuple[Dict, str]:
-    parts = command.split()
+def parse_config_command(command: str, root: Dict, parts: Optional[List[str]] = None) -> Tuple[Dict, str, Tuple[str, ...]]:
+    # Schema keys are interned at load time, so interned tokens hash and compare by identity
+    if parts is None:
+        parts = list(map(sys.intern, command.split()))
     action = parts[0]  # 'set', 'delete', or 'show'
     path_parts = parts[1:]
     config_dict = {}
@@ -119,12 +239,11 @@ def parse_config_command(command: str, root: Dict) -> Tuple[Dict, str]:
         if part in node:
             node = node[part]
         else:
-            tag_entry = next(((k, v) for k, v in node.items()
-                              if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-            if tag_entry:
-                tag_node = tag_entry[1]
+            tag_node = get_tag_node(node)
+            if tag_node:
                 validator_type = tag_node.get("validator")
-                if validator_type in validators and not validators[validator_type](part):
+                validate = validators.get(validator_type)
+                if validate and not validate(part):
                     raise ValidationError(
                         message=f"'{part}' is not a valid {validator_type.replace('-', ' ')}.",
                         cursor_position=command.find(part)
@@ -140,65 +259,106 @@ def parse_config_command(command: str, root: Dict) -> Tuple[Dict, str]:
                 current[part] = {}
             current = current[part]
 
-    return config_dict, action
+    return config_dict, action, tuple(path_parts)
 
-def update_config_dict(existing_dict, new_dict, schema_node=None, path=None, value_to_delete=False):
-    """Update an existing configuration dictionary with new values."""
-    path = path or []
+def update_config_dict(existing_dict, new_dict, schema_node=None, value_to_delete=False):
+    """
+    Update an existing configuration dictionary with new values.
+    Returns True if existing_dict was changed.
+    """
+    changed = False
     
     for key, value in new_dict.items():
-        current_path = path + [key]
-        
         # Handle deletion
         if value is None or value_to_delete:
             if key in existing_dict:
                 del existing_dict[key]
+                changed = True
             continue
 
         # Create/update the key in the existing dictionary
         if isinstance(value, dict):
             if key not in existing_dict:
                 existing_dict[key] = {}
+                changed = True
             if value:  # If value is not an empty dict
-                update_config_dict(existing_dict[key], value, schema_node, current_path)
+                changed = update_config_dict(existing_dict[key], value, schema_node) or changed
             # Don't delete empty dicts as they represent valid leaf nodes
         else:
+            if existing_dict.get(key, _MISSING) != value:
+                changed = True
             existing_dict[key] = value
+    return changed
 
 def delete_from_config_dict(config_dict, delete_dict):
-    def extract_path(d):
-        path = []
-        while isinstance(d, dict) and d:
-            key = next(iter(d))
-            path.append(key)
-            d = d[key]
-        return path
-
-    def _delete_path(current, keys):
-        if not keys:
-            print("\nError: Cannot delete – no path specified\n")
-            return False
-            
-        *parents, last_key = keys
-        for key in parents:
-            if not isinstance(current, dict) or key not in current:
-                return False
-            current = current[key]
+    return delete_by_path(config_dict, extract_path(delete_dict))
 
-        if isinstance(current, dict) and last_key in current:
-            del current[last_key]
-            # Clean up empty parent dictionaries
-            return True
+def delete_by_path(current, keys):
+    if not keys:
+        print("\nError: Cannot delete – no path specified\n")
         return False
 
-    key_path = extract_path(delete_dict)
-    return _delete_path(config_dict, key_path)
+    *parents, last_key = keys
+    for key in parents:
+        if not isinstance(current, dict) or key not in current:
+            return False
+        current = current[key]
+
+    if isinstance(current, dict) and last_key in current:
+        del current[last_key]
+        # Clean up empty parent dictionaries
+        return True
+    return False
+
+# Schema dict id -> (schema dict, its tagNode child); the dict is kept so its id can't be reused
+_tagnode_cache: Dict[int, Tuple[Dict, Optional[Dict]]] = {}
+
+def get_tag_node(schema_node: Dict) -> Optional[Dict]:
+    """Return the tagNode child of a (read-only) schema dict, scanning it only once."""
+    cached = _tagnode_cache.get(id(schema_node))
+    if cached is not None and cached[0] is schema_node:
+        return cached[1]
+    tag_node = next((v for v in schema_node.values()
+                     if isinstance(v, dict) and v.get("type") == "tagNode"), None)
+    _tagnode_cache[id(schema_node)] = (schema_node, tag_node)
+    return tag_node
+
+def index_schema(schema: Dict) -> None:
+    """Record the tagNode child of every dict in a freshly loaded schema up front."""
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        children = [v for v in node.values() if isinstance(v, dict)]
+        tag_node = next((v for v in children if v.get("type") == "tagNode"), None)
+        _tagnode_cache[id(node)] = (node, tag_node)
+        stack.extend(children)
+
+def get_schema_node(key, current_schema):
+    """Return the schema node for key, falling back to the tagNode child."""
+    if not current_schema:
+        return None
+    # First check if this is a direct child
+    if key in current_schema:
+        return current_schema[key]
+    # Then check if we have a tagNode that would match
+    return get_tag_node(current_schema)
+
+def config_tree_entry(schema_node):
+    """Build the command tree entry for a configured key."""
+    # If this key is under a tagNode or is a configured value, don't add a description
+    if schema_node and schema_node.get("type") == "tagNode":
+        return {"type": "tagNode"}
+    return {"description": schema_node.get("description", "")}
 
 def populate_config_tree(config, show_tree, include_candidate=False, candidate_config=None, schema=None):
     """
     Populate the command tree with configuration paths.
     If include_candidate is True, also include paths from the candidate configuration.
     """
+    # Nothing to add (fresh session or leaf node)
+    if not config and not (include_candidate and candidate_config):
+        return
+
     def merge_trees(tree1, tree2):
         for key, value in tree2.items():
             if key not in tree1:
@@ -206,30 +366,13 @@ def populate_config_tree(config, show_tree, include_candidate=False, candidate_c
             elif isinstance(tree1[key], dict) and isinstance(value, dict):
                 merge_trees(tree1[key], value)
 
-    def get_schema_node(key, current_schema):
-        if not current_schema:
-            return None
-        # First check if this is a direct child
-        if key in current_schema:
-            return current_schema[key]
-        # Then check if we have a tagNode that would match
-        for k, v in current_schema.items():
-            if isinstance(v, dict) and v.get("type") == "tagNode":
-                return v
-        return None
-
     # First populate with running config
     for key, value in config.items():
 
         # Get the schema node for this key
         schema_node = get_schema_node(key, schema)
 
-        # If this key is under a tagNode or is a configured value, don't add a description
-        if schema_node and schema_node.get("type") == "tagNode":
-            #print(json.dumps(schema_node.get("description"),indent=4))
-            show_tree[key] = {"type": "tagNode"}
-        else:
-            show_tree[key] = {"description": schema_node.get("description", "")}
+        show_tree[key] = config_tree_entry(schema_node)
         if isinstance(value, dict):
             populate_config_tree(value, show_tree[key], schema=schema_node)
 
@@ -242,176 +385,281 @@ def populate_config_tree(config, show_tree, include_candidate=False, candidate_c
                 # Get the schema node for this key
                 schema_node = get_schema_node(key, schema)
 
-                # If this key is under a tagNode or is a configured value, don't add a description
-                if schema_node and schema_node.get("type") == "tagNode":
-                    temp_tree[key] = {"type": "tagNode"}
-                else:
-                    temp_tree[key] = {"description": schema_node.get("description", "")}
+                temp_tree[key] = config_tree_entry(schema_node)
                 if isinstance(value, dict):
                     populate_config_tree(value, temp_tree[key], schema=schema_node)
         merge_trees(show_tree, temp_tree)
 
+def update_config_tree_path(delete_tree, schema, path_parts, op, running_config, candidate_config):
+    """
+    Patch a single path of the delete tree after a set/delete/discard.
+
+    op is "add" (create missing nodes along the path) or "remove" (drop the
+    path unless it is still configured, then prune unconfigured parents).
+    Returns the depth of the shallowest entry that changed, or None.
+    """
+    def is_configured(parts):
+        return (get_nested_value(running_config, parts) is not None
+                or get_nested_value(candidate_config, parts) is not None)
+
+    # Walk the delete tree and set schema in lockstep
+    nodes = [delete_tree]
+    schema_nodes = [schema["set"]]
+    for i, key in enumerate(path_parts):
+        schema_node = get_schema_node(key, schema_nodes[-1])
+        current = nodes[-1]
+        # Top-level entries still pointing at the shared schema are never patched in place
+        shared = i == 0 and current.get(key) is schema["delete"].get(key)
+        if key not in current or shared:
+            if op == "remove":
+                return None
+            for j in range(i, len(path_parts)):
+                current[path_parts[j]] = config_tree_entry(schema_node)
+                current = current[path_parts[j]]
+                if j + 1 < len(path_parts):
+                    schema_node = get_schema_node(path_parts[j + 1], schema_node)
+            return i
+        nodes.append(current[key])
+        schema_nodes.append(schema_node)
+
+    if op == "add":
+        return None
+
+    # Rebuild the removed path from what is still configured there
+    depth = len(path_parts) - 1
+    key = path_parts[depth]
+    if is_configured(path_parts):
+        entry = config_tree_entry(schema_nodes[-1])
+        populate_config_tree(get_nested_value(running_config, path_parts) or {}, entry,
+                             include_candidate=True,
+                             candidate_config=get_nested_value(candidate_config, path_parts),
+                             schema=schema_nodes[-1])
+        nodes[depth][key] = entry
+        return depth
+    del nodes[depth][key]
+
+    # Prune parents that no longer hold any configured children
+    while depth > 0:
+        parent = nodes[depth]
+        if any(isinstance(v, dict) for v in parent.values()) or is_configured(path_parts[:depth]):
+            break
+        depth -= 1
+        del nodes[depth][path_parts[depth]]
+    if depth == 0 and path_parts[0] in schema["delete"] and path_parts[0] not in delete_tree:
+        delete_tree[path_parts[0]] = schema["delete"][path_parts[0]]
+    return depth
+
+def lazy_config_node(config, schema_node):
+    """Compile a configured key's entry; its configured children are only built when walked into."""
+    node = compile_tree(config_tree_entry(schema_node))
+    if isinstance(config, dict) and config:
+        node.expand = lambda n: expand_config_node(n, config, schema_node)
+    return node
+
+def expand_config_node(node, config, schema):
+    """Attach one level of configured keys to a compiled node."""
+    static = dict(node.static)
+    for key, value in config.items():
+        static[sys.intern(key)] = lazy_config_node(value, get_schema_node(key, schema))
+    set_children(node, static)
+
+def refresh_command_trees(schema, commands_json, command_tree, running_config, candidate_config):
+    """
+    Rebuild the show/delete trees on top of the shared schema and recompile them in place.
+    The show tree mirrors the running config and is expanded lazily as it is walked;
+    the delete tree is built in full since set/delete/discard patch it per path.
+    """
+    show_node = compile_tree(schema["show"], command_tree.static["show"])
+    expand_config_node(show_node, running_config, schema["set"])
+
+    delete_config = {}
+    populate_config_tree(running_config, delete_config, include_candidate=True,
+                        candidate_config=candidate_config, schema=schema["set"])  # Use set schema for delete
+    commands_json["delete"] = {**schema["delete"], **delete_config}
+    compile_tree(commands_json["delete"], command_tree.static["delete"])
+
+def apply_config_change(schema, commands_json, command_tree, path_parts, op, running_config, candidate_config):
+    """Patch one path into the delete tree and recompile only the entry that changed."""
+    depth = update_config_tree_path(commands_json["delete"], schema, path_parts, op,
+                                    running_config, candidate_config)
+    if depth is None:
+        return
+    raw = commands_json["delete"]
+    node = command_tree.static["delete"]
+    for part in path_parts[:depth]:
+        raw = raw[part]
+        node = node.static[part]
+    update_child(node, path_parts[depth], raw.get(path_parts[depth]))
 
 def dict_to_set_commands(config_dict, current_path=None, show_deletions=False):
-    if current_path is None:
-        current_path = []
-    
     commands = []
-    for key, value in config_dict.items():
-        path = current_path + [key]
+    for path, value in walk(config_dict, tuple(current_path or ())):
         if value is None and show_deletions:
             # This is a deletion marker
             commands.append(f"delete {' '.join(path)}")
-        elif isinstance(value, dict):
-            if not value:  # Empty dict means it's a leaf node
-                commands.append(f"set {' '.join(path)}")
-            else:
-                commands.extend(dict_to_set_commands(value, path, show_deletions))
+        elif value == {}:  # Empty dict means it's a leaf node
+            commands.append(f"set {' '.join(path)}")
     return commands
 
+def resolve_path(running_config, candidate_config, path_parts):
+    """
+    Return the merged running/candidate subtree at path_parts, or None if it doesn't exist.
+    Only the resolved subtree is copied; neither config is modified.
+    """
+    running, candidate = running_config, candidate_config
+    for part in path_parts:
+        running = running.get(part) if type(running) is dict else None
+        if type(candidate) is dict and part in candidate:
+            candidate = candidate[part]
+            if candidate is None:  # Marked for deletion
+                return None
+        else:
+            candidate = None
+        if running is None and candidate is None:
+            return None
+
+    if not candidate:
+        return running if running is not None else candidate
+    merged = copy.deepcopy(running) if type(running) is dict else {}
+    update_config_dict(merged, candidate)
+    return merged
+
+def _emit(*lines: str) -> None:
+    """Write lines to stdout in a single call, each followed by a newline."""
+    sys.stdout.write("\n".join(lines) + "\n")
+
 def show_subtree(parts, running_config, candidate_config):
-    print("\nShowing Configuration:\n")
+    header = "\nShowing Configuration:\n"
     
     if len(parts) >= 2:
         if parts[1] == "commands":
             show_type = parts[2] if len(parts) > 2 else "candidate"
             if show_type == "running":
                 commands = dict_to_set_commands(running_config)
-                print("Running configuration:")
+                title = "Running configuration:"
             elif show_type == "candidate":
                 commands = dict_to_set_commands(candidate_config, show_deletions=True)
-                print("Candidate configuration (uncommitted changes):")
+                title = "Candidate configuration (uncommitted changes):"
             else:
-                print(f"Invalid show command: {' '.join(parts)}")
+                _emit(header, f"Invalid show command: {' '.join(parts)}")
                 return
                 
             if commands:
-                print("\n".join(commands))
+                _emit(header, title, *commands)
             else:
-                print("No configuration commands found.")
+                _emit(header, title, "No configuration commands found.")
             return
         
         elif parts[1] == "running":
-            print("Running configuration (raw format):")
-            print(json.dumps(running_config, indent=2))
+            _emit(header, "Running configuration (raw format):", dump_config_cached("running", running_config))
             return
         elif parts[1] == "candidate":
-            print("Candidate configuration (raw format):")
-            print(json.dumps(candidate_config, indent=2))
+            _emit(header, "Candidate configuration (raw format):", dump_config_cached("candidate", candidate_config))
             return
     
     # For bare 'show' command or 'show <path>'
     if len(parts) == 1:  # Just 'show'
         if candidate_config:  # If candidate config is not empty
-            print("Candidate configuration (uncommitted changes):")
-            print(json.dumps(candidate_config, indent=2))
+            _emit(header, "Candidate configuration (uncommitted changes):", dump_config_cached("candidate", candidate_config))
         else:  # If candidate config is empty
-            print("Running configuration:")
-            print(json.dumps(running_config, indent=2))
+            _emit(header, "Running configuration:", dump_config_cached("running", running_config))
         return
         
-    # For 'show <path>', use merged config
-    merged_config = running_config.copy()
-    update_config_dict(merged_config, candidate_config)
-    node = merged_config
-    
-    for part in parts[1:]:
-        if isinstance(node, dict) and part in node:
-            node = node[part]
-        else:
-            print(f"No configuration found for: {' '.join(parts[1:])}")
-            return
-    print(json.dumps(node, indent=2))
+    # For 'show <path>', merge only the subtree at that path
+    node = resolve_path(running_config, candidate_config, parts[1:])
+    if node is None:
+        _emit(header, f"No configuration found for: {' '.join(parts[1:])}")
+        return
+    _emit(header, _dumps_config(node).decode())
+
+# Commit script path -> its apply(config) entry point, or None to run it as a subprocess
+_script_registry: Dict[str, Optional[Callable[[Dict], bool]]] = {}
+
+def get_script_entrypoint(script: str) -> Optional[Callable[[Dict], bool]]:
+    """Import a commit script once and return its apply() function, if it has one."""
+    if script in _script_registry:
+        return _script_registry[script]
+    entrypoint = None
+    try:
+        name = "_commit_" + os.path.splitext(os.path.basename(script))[0]
+        spec = importlib.util.spec_from_file_location(name, os.path.abspath(script))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        entrypoint = getattr(module, "apply", None)
+    except Exception as e:
+        print(f"Warning: could not load {script} in-process, running it as a subprocess - {e}")
+    _script_registry[script] = entrypoint if callable(entrypoint) else None
+    return _script_registry[script]
+
+def merge_candidate(running, candidate):
+    """
+    Return running with the candidate changes applied.
+    Only the dicts along changed paths are copied; untouched subtrees are shared with running.
+    """
+    merged = dict(running)
+    for key, value in candidate.items():
+        if value is None:
+            merged.pop(key, None)  # Deletion marker
+        elif isinstance(value, dict):
+            current = merged.get(key)
+            if value:  # Only descend if there are more levels
+                merged[key] = merge_candidate(current if isinstance(current, dict) else {}, value)
+            elif not current:  # Empty dict means leaf node
+                merged[key] = {}
+    return merged
 
 def handle_commit(running_config, candidate_config):
     try:
         # Get list of scripts that need to be run
-        scripts_to_run = get_scripts_to_run(candidate_config)
+        scripts_to_run = get_scripts_to_run(candidate_config, _load_json_cached("config.json"))
         print("\nScripts that will be run:", scripts_to_run)
         
-        # Generate config using the merged running and candidate configs
-        merged_config = running_config.copy()
-        
-        def get_full_path(d, current_path=None):
-            if current_path is None:
-                current_path = []
-            paths = []
-            for key, value in d.items():
-                path = current_path + [key]
-                if value is None:
-                    paths.append(path)
-                elif isinstance(value, dict):
-                    paths.extend(get_full_path(value, path))
-            return paths
-
-        # Get all paths marked for deletion
-        paths_to_delete = get_full_path(candidate_config)
-        
-        # Delete specific paths from merged config
-        def delete_path(config, path):
-            if not path:
-                return
-            current = config
-            *parents, last = path
-            
-            # Navigate to parent of the node to delete
-            for key in parents:
-                if key not in current or not isinstance(current[key], dict):
-                    return
-                current = current[key]
-            
-            # Delete the node
-            if last in current:
-                del current[last]
-                
-            # Clean up empty parent dictionaries
-            if not current:
-                parent = config
-                for key in parents[:-1]:
-                    if not parent[key]:
-                        del parent[key]
-                    parent = parent[key]
-
-        # Process deletions first
-        for path in paths_to_delete:
-            delete_path(merged_config, path)
-
-        # Process additions (excluding paths marked for deletion)
-        def process_additions(target_dict, source_dict):
-            for key, value in source_dict.items():
-                if value is None:
-                    continue  # Skip deletion markers
-                elif isinstance(value, dict):
-                    if key not in target_dict:
-                        target_dict[key] = {}
-                    if value:  # Only recurse if there are more levels
-                        process_additions(target_dict[key], value)
-                    elif not target_dict[key]:  # Empty dict means leaf node
-                        target_dict[key] = {}
-
-        # Add/modify remaining items from candidate config
-        process_additions(merged_config, candidate_config)
-
-        # Run each script with the merged configuration
-        for script in scripts_to_run:
-            script_path = script  # Use the script path as-is from config.json
-            try:
-                process = subprocess.run(
-                    ['python3', script_path],
-                    input=json.dumps(merged_config),
-                    text=True,
-                    capture_output=True,
-                    check=True
+        # Generate config by merging the candidate into the running config; running_config
+        # itself is left untouched until every script has succeeded
+        merged_config = merge_candidate(running_config, candidate_config)
+
+        # Scripts without an in-process entry point are started up front so their
+        # interpreter startup overlaps, but each one blocks reading its config from
+        # stdin until its turn. Scripts still run one at a time in order, and the
+        # ones after a failure are killed before they are sent anything.
+        entrypoints = {script: get_script_entrypoint(script) for script in scripts_to_run}
+        subprocess_scripts = [s for s in scripts_to_run if entrypoints[s] is None]
+        payload = None
+        if subprocess_scripts:
+            payload = orjson.dumps(merged_config) if orjson is not None else json.dumps(merged_config).encode()
+
+        processes = {}
+        try:
+            for script in subprocess_scripts:
+                processes[script] = subprocess.Popen(
+                    ['python3', script],  # Use the script path as-is from config.json
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
                 )
-                if process.stdout:
+
+            # Run each script with the merged configuration
+            for script in scripts_to_run:
+                entrypoint = entrypoints[script]
+                if entrypoint is not None:
                     print(f"\nOutput from {script}:")
-                    print(process.stdout)
-            except subprocess.CalledProcessError as e:
-                print(f"\nError running {script}:")
-                print(e.stderr)
-                raise Exception(f"Script {script} failed with return code {e.returncode}")
-        
-        # Update running config with candidate changes
+                    if entrypoint(merged_config) is False:
+                        raise Exception(f"Script {script} failed")
+                    continue
+                process = processes.pop(script)
+                stdout, stderr = process.communicate(payload)
+                if process.returncode != 0:
+                    print(f"\nError running {script}:")
+                    print(stderr.decode(errors="replace"))
+                    raise Exception(f"Script {script} failed with return code {process.returncode}")
+                if stdout:
+                    print(f"\nOutput from {script}:")
+                    print(stdout.decode(errors="replace"))
+        finally:
+            for process in processes.values():  # Never reached their turn
+                process.kill()
+                process.communicate()
+
         running_config.clear()
         running_config.update(merged_config)
         candidate_config.clear()  # Clear candidate config after successful commit
@@ -420,115 +668,94 @@ def handle_commit(running_config, candidate_config):
     except Exception as e:
         print(f"Error during commit:\n{e}")
 
-def handle_delete_command(running_config, candidate_config, parsed_command, parts):
+def handle_delete_command(running_config, candidate_config, path):
+    """Delete a path from the candidate config. Returns True if candidate_config changed."""
     # First, check if the path exists in the candidate config
-    if key_exists_in_config(candidate_config, parsed_command):
+    if key_exists_by_path(candidate_config, path):
         # If it exists in candidate, delete it from there
-        delete_from_config_dict(candidate_config, parsed_command)
-        return
+        return delete_by_path(candidate_config, path)
     
     # If not in candidate, check if it exists in running config
-    if key_exists_in_config(running_config, parsed_command):
+    if key_exists_by_path(running_config, path):
         # If it exists in running, mark it for deletion in candidate by preserving the path
-        def mark_for_deletion(config_dict, path_dict):
-            for key, value in path_dict.items():
-                if isinstance(value, dict) and value:  # Only recurse if there are more levels
-                    if key not in config_dict:
-                        config_dict[key] = {}
-                    mark_for_deletion(config_dict[key], value)
-                else:
-                    config_dict[key] = None
-
-        mark_for_deletion(candidate_config, parsed_command)
-        return
+        *parents, last_key = path
+        current = candidate_config
+        for key in parents:
+            if key not in current:
+                current[key] = {}
+            current = current[key]
+        current[last_key] = None
+        return True
     
     # If path doesn't exist in either config
-    print(f"\nError: Cannot delete – path {' '.join(parts[1:])} does not exist in either configuration\n")
+    print(f"\nError: Cannot delete – path {' '.join(path)} does not exist in either configuration\n")
+    return False
 
 def compare_configs(running_config, candidate_config, as_commands=False):
     """Compare running and candidate configurations and show the differences."""
-    print("\nConfiguration Differences:\n")
+    header = "\nConfiguration Differences:\n"
 
     if not candidate_config:
-        print("No changes to commit (candidate configuration is empty)")
+        _emit(header, "No changes to commit (candidate configuration is empty)")
         return
 
-    def get_all_paths(config, prefix=None):
-        if prefix is None:
-            prefix = []
-        paths = {}
-        for key, value in config.items():
-            current_path = prefix + [key]
-            path_str = " ".join(current_path)
-            if value is None:
-                paths[path_str] = None
-            elif isinstance(value, dict):
-                if not value:  # Empty dict means leaf node
-                    paths[path_str] = {}
-                else:
-                    paths.update(get_all_paths(value, current_path))
-        return paths
-
-    def get_nested_value(d, path_parts):
-        current = d
-        for part in path_parts:
-            if not isinstance(current, dict) or part not in current:
-                return None
-            current = current[part]
-        return current
-
-    running_paths = get_all_paths(running_config)
-    candidate_paths = get_all_paths(candidate_config)
-
     if as_commands:
         # Show differences as commands
         added = []
         deleted = []
-        
-        # Find additions and modifications
-        for path, value in candidate_paths.items():
-            path_parts = path.split()
-            if value is None:
-                # Check if the path exists in running config before marking as deletion
-                if get_nested_value(running_config, path_parts) is not None:
-                    deleted.append(f"- delete {path}")
-            elif path not in running_paths:
-                added.append(f"+ set {path}")
 
+        # Walk the candidate, following the same path through the running config
+        stack = [((), iter(candidate_config.items()), running_config)]
+        while stack:
+            prefix, items, running = stack[-1]
+            for key, value in items:
+                path = prefix + (key,)
+                running_value = running.get(key, _MISSING) if type(running) is dict else _MISSING
+                if value is None:
+                    # Check if the path exists in running config before marking as deletion
+                    if running_value is not _MISSING and running_value is not None:
+                        deleted.append(f"- delete {' '.join(path)}")
+                elif value == {}:
+                    # Leaf nodes that aren't already leaves in the running config are additions
+                    if running_value is not None and running_value != {}:
+                        added.append(f"+ set {' '.join(path)}")
+                elif isinstance(value, dict):
+                    stack.append((path, iter(value.items()), running_value))
+                    break
+            else:
+                stack.pop()
+
+        lines = [header]
         if added or deleted:
             if deleted:
-                print("Changes that will be deleted:")
-                for line in deleted:
-                    print(line)
+                lines.append("Changes that will be deleted:")
+                lines.extend(deleted)
             if deleted and added:
-                print()
+                lines.append("")
             if added:
-                print("Changes that will be added:")
-                for line in added:
-                    print(line)
+                lines.append("Changes that will be added:")
+                lines.extend(added)
         else:
-            print("No changes found")
+            lines.append("No changes found")
+        _emit(*lines)
     else:
         # Show raw configuration differences
-        def format_dict(d, indent=0):
-            lines = []
-            for k, v in d.items():
-                if v is None:
-                    lines.append(f"{'  ' * indent}- {k}")  # Just show the key being deleted
-                elif isinstance(v, dict):
-                    if not v:  # Empty dict means leaf node
-                        lines.append(f"{'  ' * indent}+ {k}")
-                    else:
-                        lines.append(f"{'  ' * indent}{k}:")
-                        lines.extend(format_dict(v, indent + 1))
-            return lines
-
-        print("Candidate configuration changes:")
-        formatted = format_dict(candidate_config)
+        formatted = []
+        for path, v in walk(candidate_config):
+            indent = '  ' * (len(path) - 1)
+            k = path[-1]
+            if v is None:
+                formatted.append(f"{indent}- {k}")  # Just show the key being deleted
+            elif isinstance(v, dict):
+                if not v:  # Empty dict means leaf node
+                    formatted.append(f"{indent}+ {k}")
+                else:
+                    formatted.append(f"{indent}{k}:")
+
         if formatted:
-            print("\n".join(formatted))
+            _emit(header, "Candidate configuration changes:", *formatted)
         else:
-            print("No changes found")
+            _emit(header, "Candidate configuration changes:", "No changes found")
 
 def handle_compare_command(parts, running_config, candidate_config):
     """Handle the compare command and its variants."""
@@ -537,35 +764,42 @@ def handle_compare_command(parts, running_config, candidate_config):
     else:
         compare_configs(running_config, candidate_config, as_commands=False)
 
-def create_prompt_session(commands_json):
-    bindings = setup_keybindings(commands_json, print_possible_completions, suggestors)
-    completer = TreeCompleter(commands_json)
+def create_prompt_session(command_tree):
+    bindings = setup_keybindings(command_tree)
+    completer = TreeCompleter(command_tree)
 
     return PromptSession(
         completer=completer,
         key_bindings=bindings,
         complete_while_typing=False,
-        auto_suggest=AutoSuggestFromTree(commands_json),
-        history=FileHistory(os.path.expanduser("~/.cfg_history"))
+        auto_suggest=AutoSuggestFromTree(command_tree),
+        history=BatchedFileHistory(os.path.expanduser("~/.cfg_history"))
     )
 
 def main():
-    commands_json = load_commands_json()
-    session = create_prompt_session(commands_json)
+    schema = load_commands_json()
+    commands_json = dict(schema)  # Per-session root; show/delete are rebuilt on refresh
+    command_tree = compile_tree(commands_json)
+    validator = CommandValidator(command_tree)
+    session = create_prompt_session(command_tree)
     running_config = load_saved_config()  # Load the saved/running config
     candidate_config = {}  # Initialize empty candidate config
+    _dump_cache.clear()  # Drop dumps left over from a previous session
     
     # Initialize command trees with running config only
-    populate_config_tree(running_config, commands_json["show"], schema=commands_json["set"])  # Use set schema for show
-    populate_config_tree(running_config, commands_json["delete"], include_candidate=True, 
-                        candidate_config=candidate_config, schema=commands_json["set"])  # Use set schema for delete
+    refresh_command_trees(schema, commands_json, command_tree, running_config, candidate_config)
 
     print("Entering configuration mode (type 'exit' to quit, use '?' to list options)\n")
     restore_text = None
+    # User and hostname can't change mid-session
+    try:
+        user = os.getlogin()
+    except OSError:  # No controlling terminal
+        user = os.environ.get("USER", "user")
+    prompt_str = f"{user}@{socket.gethostname()}# "
 
     while True:
         try:
-            prompt_str = f"{os.getlogin()}@{socket.gethostname()}# "
             raw_input = session.prompt(prompt_str, default=restore_text or "")
             if not raw_input.strip():
                 continue
@@ -579,46 +813,47 @@ def main():
                     raise EOFError()
                 if user_input == "commit":
                     handle_commit(running_config, candidate_config)
+                    mark_config_changed("running", "candidate")
                     # After commit, update command trees with new running config
-                    populate_config_tree(running_config, commands_json["show"], schema=commands_json["set"])
-                    populate_config_tree(running_config, commands_json["delete"], include_candidate=True, 
-                                      candidate_config=candidate_config, schema=commands_json["set"])
+                    refresh_command_trees(schema, commands_json, command_tree, running_config, candidate_config)
                     continue
                 if user_input == "save":
                     save_current_config(running_config)
                     continue
                 if user_input == "discard":
+                    discarded = [path for path, value in walk(candidate_config) if value == {}]
                     candidate_config.clear()  # Clear all candidate changes
+                    mark_config_changed("candidate")
                     print("\nDiscarded all uncommitted changes")
-                    # Update command trees after discarding changes
-                    populate_config_tree(running_config, commands_json["show"], schema=commands_json["set"])
-                    populate_config_tree(running_config, commands_json["delete"], include_candidate=True, 
-                                      candidate_config=candidate_config, schema=commands_json["set"])
+                    # Drop the discarded paths from the delete tree
+                    for path_parts in discarded:
+                        apply_config_change(schema, commands_json, command_tree, path_parts, "remove",
+                                            running_config, candidate_config)
                     continue
 
                 restore_text = None
-                parts = user_input.split()
+                parts = list(map(sys.intern, user_input.split()))
 
                 try:
-                    CommandValidator(commands_json).validate(Document(user_input))
+                    validator.validate_parts(parts, user_input)
                     if parts[0] == "compare":
                         handle_compare_command(parts, running_config, candidate_config)
                         continue
 
-                    parsed_command, action = parse_config_command(user_input, commands_json)
+                    parsed_command, action, path = parse_config_command(user_input, commands_json, parts)
 
                     if action == "set":
-                        update_config_dict(candidate_config, parsed_command, commands_json)
-                        # Update command trees to include new candidate config
-                        populate_config_tree(running_config, commands_json["show"], schema=commands_json["set"])
-                        populate_config_tree(running_config, commands_json["delete"], include_candidate=True, 
-                                          candidate_config=candidate_config, schema=commands_json["set"])
+                        if update_config_dict(candidate_config, parsed_command, commands_json):
+                            mark_config_changed("candidate")
+                            # Add the new candidate path to the delete tree
+                            apply_config_change(schema, commands_json, command_tree, path, "add",
+                                                running_config, candidate_config)
                     elif action == "delete":
-                        handle_delete_command(running_config, candidate_config, parsed_command, parts)
-                        # Update command trees after deletion
-                        populate_config_tree(running_config, commands_json["show"], schema=commands_json["set"])
-                        populate_config_tree(running_config, commands_json["delete"], include_candidate=True, 
-                                          candidate_config=candidate_config, schema=commands_json["set"])
+                        if handle_delete_command(running_config, candidate_config, path):
+                            mark_config_changed("candidate")
+                            # Drop the path from the delete tree unless it is still configured
+                            apply_config_change(schema, commands_json, command_tree, path, "remove",
+                                                running_config, candidate_config)
                     elif action == "show":
                         show_subtree(parts, running_config, candidate_config)
 
@@ -635,6 +870,9 @@ def main():
         except EOFError:
             break
 
+    # Write out any batched history before handing back to operational mode
+    session.history.flush()
+
 if __name__ == "__main__":
     main()
     
@@ -1,34 +1,66 @@
+import functools
 import json
+import os
 
-def get_scripts_to_run(candidate_config):
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib decoder
+    orjson = None
+
+@functools.lru_cache(maxsize=1)
+def _load_main_config(path, mtime_ns):
+    """Parse config.json; mtime_ns is only part of the cache key so edits are picked up."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+# Protocols with configuration -> scripts, valid for the main config in _scripts_cache_source
+_scripts_cache = {}
+_scripts_cache_source = None
+# Protocol name -> script, indexed once per main config
+_script_index = {}
+
+def get_scripts_to_run(candidate_config, main_config=None):
     """
     Determine which scripts need to be run based on the candidate configuration.
     Only includes scripts for protocols that have configuration in the candidate config.
     
     Args:
         candidate_config: The candidate configuration dictionary
+        main_config: The already loaded config.json schema; read from disk if omitted
         
     Returns:
         list: List of script names to run
     """
-    scripts = []
+    global _scripts_cache_source
     
     # Get the protocols section from candidate config
     protocols = candidate_config.get('protocols', {})
     
     # Load the main config to get script mappings
-    with open('config.json', 'r') as f:
-        main_config = json.load(f)
+    if main_config is None:
+        main_config = _load_main_config('config.json', os.stat('config.json').st_mtime_ns)
+    
+    # The script list only depends on which protocols have configuration
+    key = tuple(protocol for protocol in protocols if protocols[protocol])
+    if main_config is not _scripts_cache_source:
+        _scripts_cache.clear()
+        _script_index.clear()
+        for protocol, node in main_config.get('protocols', {}).items():
+            if 'script' in node:
+                _script_index[protocol] = node['script']
+        _scripts_cache_source = main_config
+    if key in _scripts_cache:
+        return list(_scripts_cache[key])
     
-    # For each protocol in the candidate config
-    for protocol in protocols:
-        # If this protocol exists in main config and has a script field
-        if protocol in main_config.get('protocols', {}) and 'script' in main_config['protocols'][protocol]:
-            # Only add the script if there's actual configuration for this protocol
-            if protocols[protocol]:  # Check if the protocol has any configuration
-                scripts.append(main_config['protocols'][protocol]['script'])
+    # For each protocol with configuration, add its script once (dict keeps insertion order)
+    scripts = {}
+    for protocol in key:
+        if protocol in _script_index:
+            scripts[_script_index[protocol]] = None
     
-    return scripts
+    _scripts_cache[key] = list(scripts)
+    return list(scripts)
 
 if __name__ == '__main__':
     # Example usage
@@ -1,8 +1,21 @@
+import functools
 import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib decoder
+    orjson = None
+
+@functools.lru_cache(maxsize=1)
+def _load_main_config(path, mtime_ns):
+    """Parse config.json; mtime_ns is only part of the cache key so edits are picked up."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
 def get_scripts_to_run():
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+    config = _load_main_config('config.json', os.stat('config.json').st_mtime_ns)
     
     scripts = []
     # Check each protocol section for configured items and a script field
@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
+import functools
 import json
 import subprocess
 import os
+import shlex
 import socket
-from tabulate import tabulate
+import sys
+from typing import Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib decoder
+    orjson = None
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import Completer, Completion
@@ -12,35 +20,61 @@ from prompt_toolkit.application.run_in_terminal import run_in_terminal
 from prompt_toolkit.document import Document
 from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
 from prompt_toolkit.validation import Validator, ValidationError
-from prompt_toolkit.history import FileHistory
 
 
 from validators import validators
-from suggestors import suggestors
 
-from cli_common import AutoSuggestFromTree, TreeCompleter, CommandValidator, print_possible_completions
-from cli_common import setup_keybindings
+from cli_common import AutoSuggestFromTree, TreeCompleter, CommandValidator
+from cli_common import setup_keybindings, compile_tree, BatchedFileHistory
 
 import configCli
 
 
-with open("op.json") as f:
-    commands_json = json.load(f)
-
-
-def find_command(path, root):
-    node = root
+with open("op.json", "rb") as f:
+    data = f.read()
+commands_json = orjson.loads(data) if orjson is not None else json.loads(data)
+
+command_tree = compile_tree(commands_json)
+
+def index_tag_keys(root: Dict) -> Dict[int, Optional[str]]:
+    """Map id() of every op.json node to the key of its tagNode child (or None), in one pass."""
+    index = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        tag_key = None
+        for k, v in node.items():
+            if isinstance(v, dict):
+                if tag_key is None and v.get("type") == "tagNode":
+                    tag_key = k
+                stack.append(v)
+        index[id(node)] = tag_key
+    return index
+
+# op.json is never modified after load, so node ids stay valid
+tag_keys = index_tag_keys(commands_json)
+
+@functools.lru_cache(maxsize=256)
+def resolve_command(parts: Tuple[str, ...]) -> Tuple[Optional[str], int]:
+    """
+    Walk op.json for a split command line.
+    Returns the command to run (or None) and how many parts to keep when restoring
+    the input after a validation error.
+    """
+    node = commands_json
     tag_values = {}
+    rollback_index = 0
 
-    for part in path:
+    for i, part in enumerate(parts):
         if part in node:
             node = node[part]
+            rollback_index = i + 1
         else:
-            tag_key = next((k for k, v in node.items()
-                            if isinstance(v, dict) and v.get("type") == "tagNode"), None)
+            tag_key = tag_keys.get(id(node))
             if tag_key:
                 tag_values[tag_key] = part
                 node = node[tag_key]
+                rollback_index = i
             else:
                 break
 
@@ -48,40 +82,72 @@ def find_command(path, root):
         cmd = node["command"]
         for tag, val in tag_values.items():
             cmd = cmd.replace(tag, val)
-        return cmd
+        return cmd, rollback_index
 
-    return None
+    return None, rollback_index
 
-def execute_command(cmd):
-    import os
+# Commands using any of these still need /bin/sh (pipes, redirects, globs, unexpanded vars,
+# comments, negation, VAR=value assignments, multiple lines)
+SHELL_CHARS = frozenset("|&;<>()`$*?~[]#!=\n")
+
+@functools.lru_cache(maxsize=256)
+def prepare_command(cmd: str) -> Tuple[Optional[Tuple[str, ...]], str]:
+    """
+    Expand and tokenize a command once.
+    Returns the argv to exec directly (None if it needs a shell) and the expanded command line.
+    """
     expanded_cmd = os.path.expandvars(cmd)
 
-    parts = expanded_cmd.split()
-    if parts[0].endswith(".py"):
-        parts.insert(0, "python3")
-        subprocess.run(parts)
+    try:
+        parts = shlex.split(expanded_cmd)
+    except ValueError:  # Unbalanced quotes, let the shell report it
+        return None, expanded_cmd
+
+    if parts and parts[0].endswith(".py"):
+        return (sys.executable, *parts), expanded_cmd
+    if parts and SHELL_CHARS.isdisjoint(expanded_cmd):
+        # Plain argv, no need to go through /bin/sh
+        return tuple(parts), expanded_cmd
+    return None, expanded_cmd
+
+def execute_command(cmd):
+    argv, expanded_cmd = prepare_command(cmd)
+    if argv is not None:
+        try:
+            subprocess.run(argv, check=False)
+        except FileNotFoundError:
+            print(f"sh: {argv[0]}: not found", file=sys.stderr)
+        except OSError as e:
+            print(f"sh: {argv[0]}: {e.strerror}", file=sys.stderr)
     else:
         subprocess.run(expanded_cmd, shell=True)
 
 def main():
-    bindings = setup_keybindings(commands_json, print_possible_completions, suggestors)
+    bindings = setup_keybindings(command_tree)
 
-    completer = TreeCompleter(commands_json)
+    completer = TreeCompleter(command_tree)
     session = PromptSession(
         completer=completer,
         key_bindings=bindings,
         complete_while_typing=False,
-        auto_suggest=AutoSuggestFromTree(commands_json),
-        history=FileHistory(os.path.expanduser("~/.cli_history"))
+        auto_suggest=AutoSuggestFromTree(command_tree),
+        history=BatchedFileHistory(os.path.expanduser("~/.cli_history"))
     )
 
 
+    validator = CommandValidator(command_tree)
+
     print("Entering operational mode (type 'exit' to quit, use '?' to list options)\n")
     restore_text = None
+    # User and hostname can't change mid-session
+    try:
+        user = os.getlogin()
+    except OSError:  # No controlling terminal
+        user = os.environ.get("USER", "user")
+    prompt_str = f"{user}@{socket.gethostname()}:~$ "
 
     while True:
         try:
-            prompt_str = f"{os.getlogin()}@{socket.gethostname()}:~$ "
             raw_input = session.prompt(prompt_str, default=restore_text or "")
             if not raw_input.strip():
                 continue
@@ -103,27 +169,14 @@ def main():
                 parts = user_input.split()
 
                 try:
-                    CommandValidator(commands_json).validate(Document(user_input))
+                    validator.validate_parts(parts, user_input)
                 except ValidationError as ve:
                     print(f"\n{ve.message}\n")
-                    node = commands_json
-                    rollback_index = 0
-                    for i, part in enumerate(parts):
-                        if part in node:
-                            node = node[part]
-                            rollback_index = i + 1
-                        else:
-                            tag_entry = next(((k, v) for k, v in node.items()
-                                            if isinstance(v, dict) and v.get("type") == "tagNode"), None)
-                            if tag_entry:
-                                node = tag_entry[1]
-                                rollback_index = i
-                            else:
-                                break
+                    _, rollback_index = resolve_command(tuple(parts))
                     restore_text = " ".join(parts[:rollback_index]) + " "
                     continue
 
-                command = find_command(parts, commands_json)
+                command, _ = resolve_command(tuple(parts))
                 if command:
                     print(f"\nExecuting: {command}\n")
                     execute_command(command)
@@ -138,5 +191,7 @@ def main():
         except EOFError:
             break
 
+    session.history.flush()
+
 if __name__ == "__main__":
     main()
@@ -3,8 +3,19 @@
 import sys
 import json
 
-if __name__ == "__main__":
-    # Read and parse the configuration from stdin
-    config = json.load(sys.stdin)
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib decoder
+    orjson = None
+
+def apply(config):
+    """Commit entry point: receive the merged configuration."""
     print("\nBGP Configuration Received:")
-    print(json.dumps(config, indent=2)) 
\ No newline at end of file
+    print(json.dumps(config, indent=2))
+    return True
+
+if __name__ == "__main__":
+    # Read the whole payload as bytes and parse it in one go
+    data = sys.stdin.buffer.read()
+    config = orjson.loads(data) if orjson is not None else json.loads(data)
+    apply(config) 
\ No newline at end of file
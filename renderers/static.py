@@ -10,6 +10,20 @@ import tempfile
 import subprocess
 import platform
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib decoder
+    orjson = None
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Built once so parsed templates are reused across commits; templates don't change at runtime
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False
+)
+
 def extract_static_routes(config: Dict[str, Any]) -> List[Tuple[str, str, Optional[str]]]:
     """
     Extract static routes from the configuration dictionary.
@@ -39,25 +53,13 @@ def extract_static_routes(config: Dict[str, Any]) -> List[Tuple[str, str, Option
     """
     static = config.get("protocols", {}).get("static", {}).get("route", {})
     routes: List[Tuple[str, str, Optional[str]]] = []
+    append = routes.append
 
     for prefix, data in static.items():
-        next_hops = data.get("next-hop", {})
-        for nh, nh_data in next_hops.items():
-            distance_value = None
-            
-            if isinstance(nh_data, dict):
-                distance = nh_data.get("distance")
-                if isinstance(distance, dict):
-                    # Pick the first (and should be only) distance value
-                    try:
-                        distance_value = next(iter(distance))
-                    except StopIteration:
-                        # Empty distance dictionary, keep distance_value as None
-                        pass
-                    except Exception as e:
-                        print(f"Warning: Error processing distance for route {prefix} - {str(e)}")
-            
-            routes.append((prefix, nh, distance_value))
+        for nh, nh_data in (data.get("next-hop") or {}).items():
+            distance = nh_data.get("distance") if type(nh_data) is dict else None
+            # Pick the first (and should be only) distance value
+            append((prefix, nh, next(iter(distance), None) if type(distance) is dict else None))
 
     return routes
 
@@ -77,15 +79,8 @@ def generate_static_routes_config(config_dict: Dict[str, Any]) -> str:
     """
     routes = extract_static_routes(config_dict)
     
-    template_dir = os.path.dirname(os.path.abspath(__file__))
-    env = Environment(
-        loader=FileSystemLoader(template_dir),
-        trim_blocks=True,
-        lstrip_blocks=True
-    )
-    
     try:
-        template = env.get_template("frr.conf.j2")
+        template = _env.get_template("frr.conf.j2")
         return template.render(static_routes=routes)
     except Exception as e:
         print(f"Error generating FRR configuration: {str(e)}")
@@ -154,9 +149,16 @@ def apply_config(config_str: str) -> bool:
         print(f"Error: {str(e)}")
         return False
 
-if __name__ == "__main__":
-    # Read and parse the configuration from stdin
-    config = json.load(sys.stdin)
+def apply(config: Dict[str, Any]) -> bool:
+    """
+    Commit entry point: render and apply the static route configuration.
+    
+    Args:
+        config: The merged configuration dictionary
+        
+    Returns:
+        bool: True if configuration was applied successfully, False otherwise
+    """
     print("\nStatic Route Configuration Received:")
     print(json.dumps(config, indent=2))
     
@@ -164,5 +166,11 @@ if __name__ == "__main__":
     config_str = generate_static_routes_config(config)
     
     # Apply the configuration
-    if not apply_config(config_str):
+    return apply_config(config_str)
+
+if __name__ == "__main__":
+    # Read the whole payload as bytes and parse it in one go
+    data = sys.stdin.buffer.read()
+    config = orjson.loads(data) if orjson is not None else json.loads(data)
+    if not apply(config):
         sys.exit(1)  # Exit with error if configuration failed
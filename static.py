@@ -5,12 +5,22 @@ from jinja2 import Environment, FileSystemLoader, Template
 import os
 import subprocess
 import logging
+from ipaddress import ip_address, ip_network
 
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Built once so parsed templates are reused across commits; templates don't change at runtime
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False
+)
+
 def extract_static_routes(config: Dict[str, Any]) -> List[Tuple[str, str, Optional[str]]]:
     """
     Extract static routes from the configuration dictionary.
@@ -43,27 +53,14 @@ def extract_static_routes(config: Dict[str, Any]) -> List[Tuple[str, str, Option
     routes: List[Tuple[str, str, Optional[str]]] = []
 
     for prefix, data in static.items():
-        logger.debug(f"Processing route prefix: {prefix}")
-        next_hops = data.get("next-hop", {})
-        for nh, nh_data in next_hops.items():
-            distance_value = None
-            
-            if isinstance(nh_data, dict):
-                distance = nh_data.get("distance")
-                if isinstance(distance, dict):
-                    # Pick the first (and should be only) distance value
-                    try:
-                        distance_value = next(iter(distance))
-                    except StopIteration:
-                        # Empty distance dictionary, keep distance_value as None
-                        pass
-                    except Exception as e:
-                        logger.warning(f"Error processing distance for route {prefix} - {str(e)}")
+        for nh, nh_data in (data.get("next-hop") or {}).items():
+            distance = nh_data.get("distance") if type(nh_data) is dict else None
+            # Pick the first (and should be only) distance value
+            distance_value = next(iter(distance), None) if type(distance) is dict else None
             
             routes.append((prefix, nh, distance_value))
-            logger.info(f"Added route: {prefix} via {nh}" + (f" distance {distance_value}" if distance_value else ""))
 
-    logger.info(f"Extracted {len(routes)} static routes")
+    logger.info("Extracted %d static routes", len(routes))
     return routes
 
 def generate_static_routes_config(config_dict: Dict[str, Any]) -> str:
@@ -83,22 +80,14 @@ def generate_static_routes_config(config_dict: Dict[str, Any]) -> str:
     logger.info("Generating FRR configuration for static routes")
     routes = extract_static_routes(config_dict)
     
-    template_dir = os.path.dirname(os.path.abspath(__file__))
-    logger.debug(f"Using template directory: {template_dir}")
-    env = Environment(
-        loader=FileSystemLoader(template_dir),
-        trim_blocks=True,
-        lstrip_blocks=True
-    )
-    
     try:
-        template = env.get_template("frr.conf.j2")
+        template = _env.get_template("frr.conf.j2")
         config = template.render(static_routes=routes)
         logger.info("Successfully generated FRR configuration")
-        logger.debug(f"Generated configuration:\n{config}")
+        logger.debug("Generated configuration:\n%s", config)
         return config
     except Exception as e:
-        logger.error(f"Error generating FRR configuration: {str(e)}")
+        logger.error("Error generating FRR configuration: %s", e)
         return ""  # Return empty string on error
 
 def apply_config(config_dict: Dict[str, Any]) -> bool:
@@ -119,37 +108,28 @@ def apply_config(config_dict: Dict[str, Any]) -> bool:
             logger.error("No static routes configuration generated")
             return False
 
-        # Write configuration to temporary file
-        temp_file = "/tmp/frr_static_routes.conf"
-        logger.debug(f"Writing configuration to temporary file: {temp_file}")
-        with open(temp_file, "w") as f:
-            f.write(frr_config)
-
-        # Apply configuration using vtysh
+        # Apply configuration using vtysh, piping it in rather than going through a temp file
         logger.info("Applying configuration using vtysh")
         result = subprocess.run(
-            ["vtysh", "-f", temp_file],
+            ["vtysh", "-f", "/dev/stdin"],
+            input=frr_config,
             capture_output=True,
             text=True,
             check=True
         )
 
-        # Clean up temporary file
-        os.remove(temp_file)
-        logger.debug("Removed temporary configuration file")
-
         if result.returncode == 0:
             logger.info("Static routes configuration applied successfully")
             return True
         else:
-            logger.error(f"Error applying static routes configuration: {result.stderr}")
+            logger.error("Error applying static routes configuration: %s", result.stderr)
             return False
 
     except subprocess.CalledProcessError as e:
-        logger.error(f"Error executing vtysh command: {e.stderr}")
+        logger.error("Error executing vtysh command: %s", e.stderr)
         return False
     except Exception as e:
-        logger.error(f"Error applying static routes configuration: {str(e)}")
+        logger.error("Error applying static routes configuration: %s", e)
         return False
 
 def validate_config(config_dict: Dict[str, Any]) -> bool:
@@ -170,24 +150,30 @@ def validate_config(config_dict: Dict[str, Any]) -> bool:
             return False
 
         for prefix, next_hop, distance in routes:
-            # Basic validation of prefix format
-            if '/' not in prefix:
-                logger.error(f"Invalid prefix format: {prefix}")
+            # Validate prefix format
+            try:
+                if '/' not in prefix:
+                    raise ValueError(prefix)
+                ip_network(prefix, strict=False)
+            except ValueError:
+                logger.error("Invalid prefix format: %s", prefix)
                 return False
 
-            # Basic validation of next-hop format
-            if not next_hop or next_hop.count('.') != 3:
-                logger.error(f"Invalid next-hop format: {next_hop}")
+            # Validate next-hop format
+            try:
+                ip_address(next_hop)
+            except ValueError:
+                logger.error("Invalid next-hop format: %s", next_hop)
                 return False
 
             # Validate distance if present
-            if distance and not distance.isdigit():
-                logger.error(f"Invalid distance value: {distance}")
+            if distance and not (distance.isdigit() and 1 <= int(distance) <= 255):
+                logger.error("Invalid distance value: %s", distance)
                 return False
 
         logger.info("Static routes configuration validation successful")
         return True
 
     except Exception as e:
-        logger.error(f"Error validating static routes configuration: {str(e)}")
+        logger.error("Error validating static routes configuration: %s", e)
         return False
@@ -1,7 +1,24 @@
 #!/usr/bin/env python3
 
+import logging
 import os
-from typing import List, Optional, Union
+import sys
+import threading
+import time
+import types
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Seconds a suggestor's output is reused before it is called again
+SUGGESTOR_TTL = 2.0
+
+# Interface name prefixes listed by default
+INTERFACE_FILTER = (
+    'eth', 'bond', 'br', 'dum', 'gnv', 'ifb', 'l2tpeth', 'lo', 'macsec', 'peth',
+    'pppoe', 'sstpc', 'tun', 'veth', 'vti', 'vtun', 'vxlan', 'wlan', 'wg',
+    'wwan', 'zt'
+)
 
 def list_interfaces(prefixes: Optional[Union[List[str], str]] = None) -> List[str]:
     """
@@ -14,37 +31,68 @@ def list_interfaces(prefixes: Optional[Union[List[str], str]] = None) -> List[st
     Returns:
         List of interface names sorted alphabetically
     """
-    interface_filter = [
-        'eth', 'bond', 'br', 'dum', 'gnv', 'ifb', 'l2tpeth', 'lo', 'macsec', 'peth',
-        'pppoe', 'sstpc', 'tun', 'veth', 'vti', 'vtun', 'vxlan', 'wlan', 'wg',
-        'wwan', 'zt'
-    ]
-    
+    # str.startswith takes a tuple and checks every prefix in one call
     if prefixes is None:
-        prefixes = interface_filter
+        prefixes = INTERFACE_FILTER
     elif isinstance(prefixes, str):
-        prefixes = [prefixes]
+        prefixes = (prefixes,)
+    else:
+        prefixes = tuple(prefixes)
         
+    net_dir = "/sys/class/net"
     try:
-        net_dir = "/sys/class/net"
-        
-        if not os.path.exists(net_dir):
-            print(f"Warning: Network interface directory {net_dir} not found")
-            return []
-            
-        interfaces = os.listdir(net_dir)
-        return sorted([iface for iface in interfaces 
-                      if any(iface.startswith(p) for p in prefixes)])
-                
+        with os.scandir(net_dir) as entries:
+            interfaces = [entry.name for entry in entries if entry.name.startswith(prefixes)]
+    except FileNotFoundError:
+        logger.warning("Network interface directory %s not found", net_dir)
+        return []
     except PermissionError:
-        print(f"Warning: Permission denied accessing {net_dir}")
+        logger.warning("Permission denied accessing %s", net_dir)
         return []
-    except Exception as e:
-        print(f"Warning: Error listing interfaces - {str(e)}")
+    except OSError as e:
+        logger.warning("Error listing interfaces - %s", e)
         return []
 
-#print(list_interfaces())
+    interfaces.sort()
+    return interfaces
 
-suggestors = {
+# Read-only registry; interned keys let lookups with interned names match by identity
+suggestors = types.MappingProxyType({sys.intern(k): v for k, v in {
     "list_interfaces": list_interfaces
-}
+}.items()})
+
+# Completion listings call suggestors from a worker thread as well as the event loop
+_suggestor_cache: Dict[Tuple[str, Tuple[Any, ...]], Tuple[float, List[str]]] = {}
+_suggestor_lock = threading.Lock()
+
+def _freeze_args(args: Any) -> Any:
+    """Turn suggestor args (lists, possibly nested, as in op.json) into hashable tuples."""
+    if isinstance(args, (list, tuple)):
+        return tuple(_freeze_args(arg) for arg in args)
+    return args
+
+def get_suggestor_values(name: str, args: Sequence[str] = (), dynamic: bool = False) -> List[str]:
+    """
+    Call a registered suggestor, reusing its output for SUGGESTOR_TTL seconds.
+    Suggestors on nodes marked dynamic are called every time.
+    The returned list is shared between callers and must not be modified.
+    """
+    fn = suggestors[name]
+    if dynamic:
+        return fn(*args)
+    key = (name, _freeze_args(args))
+    try:
+        hash(key)
+    except TypeError:  # Args that still can't be hashed (e.g. dicts) are not cached
+        return fn(*args)
+
+    now = time.monotonic()
+    with _suggestor_lock:
+        cached = _suggestor_cache.get(key)
+    if cached is not None and now - cached[0] < SUGGESTOR_TTL:
+        return cached[1]
+
+    values = fn(*args)
+    with _suggestor_lock:
+        _suggestor_cache[key] = (now, values)
+    return values
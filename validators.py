@@ -1,12 +1,41 @@
 #!/usr/bin/env python3
 
+import functools
 import ipaddress
+import logging
 import subprocess
 import json
+import sys
+import time
+import types
 from typing import List, Callable, Dict, Any, Optional
 
+try:
+    from pyroute2 import IPRoute
+except ImportError:  # pyroute2 is optional, fall back to running 'ip'
+    IPRoute = None
+
+logger = logging.getLogger(__name__)
+
+def _is_ipv4(value: str) -> bool:
+    """Check a dotted-quad IPv4 address with the same rules as ipaddress, without building an object."""
+    parts = value.split(".")
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not (part.isascii() and part.isdigit()) or len(part) > 3:
+            return False
+        if len(part) > 1 and part[0] == "0":  # Leading zeros are ambiguous (octal)
+            return False
+        if int(part) > 255:
+            return False
+    return True
+
 def validate_ip_address(value: str) -> bool:
     """Validate if a string is a valid IP address."""
+    # Anything without a colon can only be IPv4
+    if ":" not in value:
+        return _is_ipv4(value)
     try:
         ipaddress.ip_address(value)
         return True
@@ -15,6 +44,13 @@ def validate_ip_address(value: str) -> bool:
 
 def validate_ip_prefix(value: str) -> bool:
     """Validate if a string is a valid IP prefix (CIDR notation)."""
+    if ":" not in value:
+        address, slash, length = value.partition("/")
+        if not slash:
+            return _is_ipv4(address)
+        if length.isascii() and length.isdigit():
+            return _is_ipv4(address) and int(length) <= 32
+        # Netmask/hostmask forms are left to ipaddress
     try:
         ipaddress.ip_network(value, strict=False)
         return True
@@ -23,48 +59,81 @@ def validate_ip_prefix(value: str) -> bool:
 
 def validate_ip_address_or_prefix(value: str) -> bool:
     """Validate if a string is either a valid IP address or prefix."""
-    return validate_ip_address(value) or validate_ip_prefix(value)
+    # Only a prefix can contain a slash, and a bare prefix is just an address
+    return validate_ip_prefix(value) if "/" in value else validate_ip_address(value)
+
+# Seconds the VRF list from 'ip vrf show' is reused before it is queried again
+VRF_TTL = 1.0
+
+_vrf_cache: Dict[str, Any] = {"names": None, "ts": 0.0}
+
+# Netlink socket reused for VRF queries, opened on first use
+_ipr = None
+
+def _vrf_names_netlink() -> frozenset:
+    """Query VRF device names over netlink, without forking 'ip'."""
+    global _ipr
+    if _ipr is None:
+        _ipr = IPRoute()
+    names = set()
+    for link in _ipr.get_links():
+        linkinfo = link.get_attr("IFLA_LINKINFO")
+        if linkinfo is not None and linkinfo.get_attr("IFLA_INFO_KIND") == "vrf":
+            names.add(link.get_attr("IFLA_IFNAME"))
+    return frozenset(names)
 
 def validate_vrf_name(value: str) -> bool:
     """Validate if a string is a valid VRF name."""
     if value == "all":
         return True
 
+    names = _vrf_cache["names"]
+    now = time.monotonic()
+    if names is not None and now - _vrf_cache["ts"] < VRF_TTL:
+        return value in names
+
+    if IPRoute is not None:
+        try:
+            names = _vrf_names_netlink()
+        except Exception as e:  # Any netlink failure falls back to 'ip'
+            logger.debug("Netlink VRF query failed, falling back to 'ip': %s", e)
+        else:
+            _vrf_cache["names"] = names
+            _vrf_cache["ts"] = now
+            return value in names
+
     try:
         result = subprocess.run(
             ["ip", "-j", "vrf", "show"],
-            capture_output=True,
-            text=True,
+            capture_output=True,  # Bytes; json.loads decodes them itself
             check=True
         )
-        vrf_list = json.loads(result.stdout)
-        valid_names = [vrf.get("name") for vrf in vrf_list if "name" in vrf]
-        return value in valid_names
-    except subprocess.SubprocessError:
-        print("Warning: Could not check VRF name - 'ip' command failed")
+    except (subprocess.SubprocessError, OSError) as e:
+        logger.warning("Could not check VRF name - 'ip' command failed: %s", e)
         return True  # Allow the name if we can't verify
+
+    try:
+        vrf_list = json.loads(result.stdout)
+        names = frozenset(vrf.get("name") for vrf in vrf_list if "name" in vrf)
     except json.JSONDecodeError:
-        print("Warning: Could not parse VRF list - invalid JSON format")
+        logger.warning("Could not parse VRF list - invalid JSON format")
         return True  # Allow the name if we can't verify
-    except Exception as e:
-        print(f"Warning: VRF name validation failed - {str(e)}")
+    except (TypeError, AttributeError):
+        logger.warning("Could not parse VRF list - unexpected structure")
         return True  # Allow the name if we can't verify
+
+    _vrf_cache["names"] = names
+    _vrf_cache["ts"] = now
+    return value in names
     
 def is_num_1_65535(value: str) -> bool:
     """Validate if a string represents a number between 1 and 65535."""
-    try:
-        val = int(value)
-        return 1 <= val <= 65535
-    except ValueError:
-        return False
+    # Plain ASCII digits only; rejects without raising ValueError
+    return value.isascii() and value.isdigit() and 1 <= int(value) <= 65535
     
 def is_num_1_255(value: str) -> bool:
     """Validate if a string represents a number between 1 and 255."""
-    try:
-        val = int(value)
-        return 1 <= val <= 255
-    except ValueError:
-        return False
+    return value.isascii() and value.isdigit() and 1 <= int(value) <= 255
     
 def is_valid_enum(value: str, allowed: List[str]) -> bool:
     """Validate if a value is in a list of allowed values."""
@@ -72,7 +141,8 @@ def is_valid_enum(value: str, allowed: List[str]) -> bool:
 
 def make_enum_validator(allowed_values: List[str]) -> Callable[[str], bool]:
     """Create a validator function for enum values."""
-    return lambda value: is_valid_enum(value, allowed_values)
+    # The bound frozenset lookup is a single C call per check
+    return frozenset(allowed_values).__contains__
 
 # Dictionary mapping validator names to their functions
 validators: Dict[str, Callable[[str], bool]] = {
@@ -84,3 +154,13 @@ validators: Dict[str, Callable[[str], bool]] = {
     "num-1-255": is_num_1_255,
     "enum": None  # This is handled specially in the command validator
 }
+
+# Validators whose result depends only on the value are memoized; the same
+# token is re-validated on every keystroke while a line is being edited.
+# vrf-name depends on system state and is not cached here.
+PURE_VALIDATORS = ("ip-address", "ip-prefix", "ip-address-or-prefix", "num-1-65535", "num-1-255")
+for _name in PURE_VALIDATORS:
+    validators[_name] = functools.lru_cache(maxsize=4096)(validators[_name])
+
+# Read-only from here on; interned keys let lookups with interned names match by identity
+validators = types.MappingProxyType({sys.intern(k): v for k, v in validators.items()})